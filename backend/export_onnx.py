@@ -0,0 +1,20 @@
+# One-off export of model.h5 to model.onnx for ONNX Runtime inference.
+# Optional: ml_model.py only uses ONNX Runtime when both model.onnx exists and
+# onnxruntime is installed; otherwise it serves the Keras model.
+# Run after the model has been downloaded:  pip install tf2onnx && python export_onnx.py
+# Then install the runtime in the serving image:  pip install onnxruntime
+import os
+import tensorflow as tf
+import tf2onnx
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.getenv("MODEL_DIR", BASE_DIR)
+MODEL_PATH = os.path.join(MODEL_DIR, "model.h5")
+ONNX_PATH = os.path.join(MODEL_DIR, "model.onnx")
+
+if __name__ == "__main__":
+    model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+    # Dynamic batch dimension so the batch scheduler can stack requests
+    spec = (tf.TensorSpec((None, 128, 128, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=15, output_path=ONNX_PATH)
+    print(f"✅ ONNX model written to {ONNX_PATH}")
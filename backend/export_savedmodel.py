@@ -0,0 +1,23 @@
+# One-off conversion of model.h5 to a TensorFlow SavedModel directory.
+# ml_model.py prefers model_savedmodel/ when present; it loads faster than
+# HDF5 and skips optimizer/loss reconstruction.
+# Run after the model has been downloaded:  python export_savedmodel.py
+import os
+import shutil
+import tensorflow as tf
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.getenv("MODEL_DIR", BASE_DIR)
+MODEL_PATH = os.path.join(MODEL_DIR, "model.h5")
+SAVED_MODEL_DIR = os.path.join(MODEL_DIR, "model_savedmodel")
+
+if __name__ == "__main__":
+    model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+    # Written to a temp dir and renamed so a running server never picks up
+    # a half-written model
+    tmp_dir = f"{SAVED_MODEL_DIR}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    model.save(tmp_dir, save_format='tf')
+    shutil.rmtree(SAVED_MODEL_DIR, ignore_errors=True)
+    os.rename(tmp_dir, SAVED_MODEL_DIR)
+    print(f"✅ SavedModel written to {SAVED_MODEL_DIR}")
@@ -0,0 +1,42 @@
+# One-off INT8 quantisation of model.h5 to model_int8.tflite.
+# Needs a folder of representative MRI scans for calibration:
+#   python export_tflite.py path/to/sample_scans
+import os
+import sys
+import cv2
+import numpy as np
+import tensorflow as tf
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.getenv("MODEL_DIR", BASE_DIR)
+MODEL_PATH = os.path.join(MODEL_DIR, "model.h5")
+TFLITE_PATH = os.path.join(MODEL_DIR, "model_int8.tflite")
+NUM_SAMPLES = 50
+
+def representative_dataset(sample_dir):
+    # Same preprocessing as final_fix_predict_v4 in ml_model.py
+    names = sorted(os.listdir(sample_dir))[:NUM_SAMPLES]
+    for name in names:
+        bgr = cv2.imread(os.path.join(sample_dir, name), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        if bgr is None:
+            continue
+        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        img = cv2.resize(rgb, (128, 128), interpolation=cv2.INTER_NEAREST_EXACT)
+        yield [img[None, ...].astype(np.float32) * np.float32(1.0 / 255.0)]
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python export_tflite.py <sample_scans_dir>")
+        sys.exit(1)
+
+    model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = lambda: representative_dataset(sys.argv[1])
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+
+    with open(TFLITE_PATH, "wb") as f:
+        f.write(converter.convert())
+    print(f"✅ INT8 model written to {TFLITE_PATH}")
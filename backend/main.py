@@ -1,7 +1,6 @@
 from fastapi import FastAPI, File, UploadFile, Response, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
-import shutil
-import os
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 from ml_model import predict_tumor
 
@@ -20,9 +19,6 @@ app.add_middleware(
 # 3. In-memory storage for the latest report
 last_report_bytes = None
 
-# 🟢 ROBUST PATH SETUP: Get the absolute path of the 'backend' folder
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
 @app.get("/")
 def home():
     return {"message": "NeuroScan AI Server is Online"}
@@ -42,14 +38,9 @@ async def predict_endpoint(
 ):
     global last_report_bytes
     
-    # 🟢 SAVE SAFELY: Save the image directly in the 'backend' folder
-    # This prevents "File Not Found" errors if you run the terminal from elsewhere
-    file_path = os.path.join(BASE_DIR, file.filename)
-    
     try:
-        # A. Save the MRI scan temporarily
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # A. Read the MRI scan straight into memory (no temp file round trip)
+        image_bytes = await file.read()
         
         # B. Bundle the data into a clean dictionary
         patient_data = {
@@ -63,23 +54,19 @@ async def predict_endpoint(
         }
         
         # C. Run AI logic
-        # We pass the absolute 'file_path' so ml_model.py can definitely find it
-        prediction = predict_tumor(file_path, patient_data)
+        # The raw upload bytes are decoded in memory by ml_model.py
+        # Runs off the event loop so concurrent scans can share a model batch
+        prediction = await run_in_threadpool(predict_tumor, image_bytes, patient_data)
         
         # D. Extract and store the PDF bytes
         if "pdf_bytes" in prediction:
-            last_report_bytes = bytes.fromhex(prediction.pop("pdf_bytes"))
+            last_report_bytes = prediction.pop("pdf_bytes")
         
         return prediction
 
     except Exception as e:
         print(f"CRITICAL SERVER ERROR: {e}")
         return {"result": "Error", "error": str(e)}
-        
-    finally:
-        # Cleanup: Delete the MRI image immediately after analysis
-        if os.path.exists(file_path):
-            os.remove(file_path)
 
 # --- THE PDF DOWNLOAD ENDPOINT ---
 @app.get("/download_report")
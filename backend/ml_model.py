@@ -1,11 +1,17 @@
 import numpy as np
-from PIL import Image
 import os
 import cv2
 import io
 import re
 import html  
+import queue
+import threading
+import time
+# Must be set before TensorFlow is imported
+os.environ.setdefault('TF_FORCE_GPU_ALLOW_GROWTH', 'true')
 import tensorflow as tf
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime
 from google import genai 
 import gdown 
@@ -33,19 +39,63 @@ if not PROJECT_ID:
 else:
     os.environ["GOOGLE_CLOUD_PROJECT"] = PROJECT_ID
 
-try:
-    client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
-    print(f"✅ SUCCESS: Connected to Vertex AI ({PROJECT_ID})")
-except Exception as e:
-    print(f"❌ AUTH ERROR: Vertex AI Connection Failed. {e}")
+# The client is created on first use, not at import, so worker start-up is
+# not blocked on Vertex AI authentication
+_client = None
+_client_lock = threading.Lock()
+
+def _get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    _client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+                    print(f"✅ SUCCESS: Connected to Vertex AI ({PROJECT_ID})")
+                except Exception as e:
+                    print(f"❌ AUTH ERROR: Vertex AI Connection Failed. {e}")
+                    raise
+    return _client
 
 # --- 2. SETUP LOCAL MODEL ---
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-model = None
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "model.h5")
+# Point MODEL_DIR at a mounted volume so the download and any exported
+# models (see export_savedmodel.py) survive restarts instead of being
+# fetched again by every new container
+MODEL_DIR = os.getenv("MODEL_DIR", BASE_DIR)
+MODEL_PATH = os.path.join(MODEL_DIR, "model.h5")
+SAVED_MODEL_DIR = os.path.join(MODEL_DIR, "model_savedmodel")
+
+# Optional ONNX Runtime classifier (see export_onnx.py). The Keras model is
+# still required for Grad-CAM, which needs gradients.
+ONNX_PATH = os.path.join(MODEL_DIR, "model.onnx")
 
-if not os.path.exists(MODEL_PATH):
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# Optional INT8 classifier (see export_tflite.py). Quantisation trades a little
+# accuracy for speed, so it is only used when this file has been deployed;
+# it then takes precedence over ONNX. Grad-CAM still uses the FP32 Keras model.
+TFLITE_PATH = os.path.join(MODEL_DIR, "model_int8.tflite")
+
+# Model, ONNX session and Grad-CAM sub-model are loaded once, on the first
+# prediction. Forked workers start fast and share pages until then.
+_model = None
+_model_lock = threading.Lock()
+# A failed download/load is retried, but at most once per MODEL_RETRY_SECONDS
+# so a broken model does not turn every request into a Drive download
+MODEL_RETRY_SECONDS = 30
+_model_retry_at = 0.0
+_grad_model = None
+onnx_session = None
+onnx_input_name = None
+tflite_interpreter = None
+_tflite_by_size = {}
+
+def _download_model():
     print(f"⚠️ Model not found at {MODEL_PATH}")
     print("⬇️ Downloading from Google Drive...")
     try:
@@ -56,18 +106,284 @@ if not os.path.exists(MODEL_PATH):
     except Exception as e:
         print(f"❌ DOWNLOAD FAILED: {e}")
 
-try:
-    if os.path.exists(MODEL_PATH):
-        model = tf.keras.models.load_model(MODEL_PATH)
-        print(f"✅ SUCCESS: Model Loaded")
-    else:
-        print(f"❌ ERROR: Model missing.")
-except Exception as e:
-    print(f"❌ CRITICAL ERROR: TensorFlow failed. {e}")
+def _load_onnx_session():
+    global onnx_session, onnx_input_name
+    if ort is None or not os.path.exists(ONNX_PATH):
+        return
+    try:
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = os.cpu_count() or 1
+        onnx_session = ort.InferenceSession(ONNX_PATH, sess_options=sess_options, providers=['CPUExecutionProvider'])
+        onnx_input_name = onnx_session.get_inputs()[0].name
+        print(f"✅ SUCCESS: ONNX Runtime Loaded")
+    except Exception as e:
+        print(f"⚠️ ONNX Runtime unavailable, using TensorFlow. {e}")
+        onnx_session = None
+
+def _new_tflite_interpreter(batch_size):
+    interpreter = tf.lite.Interpreter(model_path=TFLITE_PATH, num_threads=os.cpu_count() or 1)
+    if batch_size != 1:
+        input_index = interpreter.get_input_details()[0]['index']
+        interpreter.resize_tensor_input(input_index, [batch_size, 128, 128, 3])
+    interpreter.allocate_tensors()
+    return interpreter
+
+def _load_tflite_interpreter():
+    global tflite_interpreter
+    if not os.path.exists(TFLITE_PATH):
+        return
+    try:
+        interpreter = _new_tflite_interpreter(1)
+        _tflite_by_size[1] = interpreter
+        tflite_interpreter = interpreter
+        print(f"✅ SUCCESS: INT8 TFLite Model Loaded")
+    except Exception as e:
+        print(f"⚠️ TFLite unavailable, using FP32 model. {e}")
+
+def _build_grad_model(model):
+    global _grad_model
+    try:
+        vgg = model.get_layer('vgg16')
+        _grad_model = tf.keras.models.Model([vgg.input], [vgg.get_layer("block5_conv3").output, vgg.output])
+    except Exception as e:
+        print(f"⚠️ Grad-CAM setup failed. {e}")
+
+def _get_model():
+    global _model, _model_retry_at
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is not None or time.monotonic() < _model_retry_at:
+            return _model
+
+        if not os.path.isdir(SAVED_MODEL_DIR) and not os.path.exists(MODEL_PATH):
+            _download_model()
+
+        # compile=False: inference only, no optimizer/loss reconstruction
+        model = None
+        try:
+            if os.path.isdir(SAVED_MODEL_DIR):
+                model = tf.keras.models.load_model(SAVED_MODEL_DIR, compile=False)
+                print(f"✅ SUCCESS: Model Loaded (SavedModel)")
+            elif os.path.exists(MODEL_PATH):
+                model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+                print(f"✅ SUCCESS: Model Loaded")
+            else:
+                print(f"❌ ERROR: Model missing.")
+        except Exception as e:
+            print(f"❌ CRITICAL ERROR: TensorFlow failed. {e}")
+
+        if model is None:
+            _model_retry_at = time.monotonic() + MODEL_RETRY_SECONDS
+            print(f"🔁 Model load will be retried in {MODEL_RETRY_SECONDS}s")
+            return None
+
+        _build_grad_model(model)
+        _load_tflite_interpreter()
+        # _forward never reaches ONNX when the INT8 model is active
+        if tflite_interpreter is None:
+            _load_onnx_session()
+        # Published last so other threads never see a half-initialised model
+        _model = model
+    return _model
 
 # --- 3. PREDICTION ENGINE ---
-def final_fix_predict_v4(img_path, model):
-    if not os.path.exists(img_path):
+# Per-thread scratch arrays: reused across requests without sharing between
+# the threadpool workers that serve concurrent scans
+_scratch = threading.local()
+
+def _thread_buffer(name, shape, dtype):
+    buf = getattr(_scratch, name, None)
+    if buf is None or buf.shape != shape:
+        buf = np.empty(shape, dtype)
+        setattr(_scratch, name, buf)
+    return buf
+
+class BatchScheduler:
+    # Coalesces concurrent single-image requests into one model call.
+    # A worker waits up to max_wait seconds (or max_batch images) after the
+    # first request arrives, stacks the inputs, runs them together and hands
+    # each caller back its own row through a Future.
+    def __init__(self, forward_fn, max_batch=8, max_wait=0.02):
+        self.forward_fn = forward_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, img_expanded):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((img_expanded, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                inputs = np.concatenate([item for item, _ in batch], axis=0)
+                preds = self.forward_fn(inputs)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for item, future in batch:
+                future.set_result(preds[offset:offset + len(item)])
+                offset += len(item)
+
+# Errors TensorFlow raises when XLA cannot compile a graph on this platform
+# (missing JIT device, unsupported op). Anything else, e.g. OOM or a bug in
+# the traced function, is re-raised rather than disabling XLA.
+_XLA_COMPILE_ERRORS = (tf.errors.InvalidArgumentError, tf.errors.UnimplementedError, tf.errors.NotFoundError)
+
+def _is_xla_compile_error(e):
+    msg = str(e).lower()
+    return isinstance(e, _XLA_COMPILE_ERRORS) and ("xla" in msg or "compil" in msg)
+
+def _xla_function(fn, input_signature, name):
+    # Traces fn once per signature with XLA fusion; XLA is not available on
+    # every platform, so a compile failure switches to a plain graph
+    xla_fn = tf.function(fn, jit_compile=True, input_signature=input_signature)
+    plain_fn = tf.function(fn, input_signature=input_signature)
+    active = [xla_fn]
+
+    def call(*args):
+        try:
+            return active[0](*args)
+        except Exception as e:
+            if active[0] is plain_fn or not _is_xla_compile_error(e):
+                raise
+            print(f"⚠️ XLA unavailable, using plain graph for {name}. {e}")
+            active[0] = plain_fn
+            return plain_fn(*args)
+
+    return call
+
+# XLA compiles one executable per concrete batch size, so batches are padded
+# up to a few fixed sizes: at most len(_BATCH_BUCKETS) compiles per process
+_BATCH_BUCKETS = (1, 2, 4, 8)
+
+def _pad_to_bucket(batch):
+    size = next(b for b in _BATCH_BUCKETS if b >= len(batch))
+    if size == len(batch):
+        return batch
+    padding = np.zeros((size - len(batch),) + batch.shape[1:], dtype=batch.dtype)
+    return np.concatenate([batch, padding], axis=0)
+
+_keras_forward = _xla_function(
+    lambda x: _get_model()(x, training=False),
+    [tf.TensorSpec([None, 128, 128, 3], tf.float32)],
+    "classifier",
+)
+
+def _tflite_invoke(interpreter, batch):
+    inp = interpreter.get_input_details()[0]
+    out = interpreter.get_output_details()[0]
+    in_scale, in_zero = inp['quantization']
+    out_scale, out_zero = out['quantization']
+
+    if inp['dtype'] == np.int8:
+        batch = np.clip(np.round(batch / in_scale + in_zero), -128, 127).astype(np.int8)
+
+    interpreter.set_tensor(inp['index'], batch)
+    interpreter.invoke()
+    raw = interpreter.get_tensor(out['index'])
+    if out['dtype'] == np.int8:
+        return (raw.astype(np.float32) - out_zero) * out_scale
+    return raw.astype(np.float32, copy=False)
+
+def _tflite_bucket_interpreter(size):
+    # Bucket interpreters are resized and allocated on first use; a bucket that
+    # cannot be built is remembered as False so it is not retried every batch
+    interpreter = _tflite_by_size.get(size)
+    if interpreter is None:
+        try:
+            interpreter = _new_tflite_interpreter(size)
+        except Exception as e:
+            print(f"⚠️ TFLite batch size {size} unavailable, invoking per image. {e}")
+            interpreter = False
+        _tflite_by_size[size] = interpreter
+    return interpreter
+
+def _tflite_forward(batch):
+    # One interpreter per batch bucket so a whole scheduler batch runs in a
+    # single invoke(). Only the batch-scheduler thread drives these, so no
+    # locking is needed.
+    n = len(batch)
+    padded = _pad_to_bucket(batch)
+    interpreter = _tflite_bucket_interpreter(len(padded))
+    if interpreter:
+        return _tflite_invoke(interpreter, padded)[:n]
+
+    # Fall back to the always-allocated size-1 interpreter
+    return np.concatenate([_tflite_invoke(tflite_interpreter, batch[i:i + 1]) for i in range(n)], axis=0)
+
+def _forward(batch):
+    if tflite_interpreter is not None:
+        return _tflite_forward(batch)
+    if onnx_session is not None:
+        return onnx_session.run(None, {onnx_input_name: batch})[0]
+    padded = _pad_to_bucket(batch)
+    return _keras_forward(tf.constant(padded)).numpy()[:len(batch)]
+
+_batcher = BatchScheduler(_forward, max_batch=_BATCH_BUCKETS[-1])
+
+# Grad-CAM sub-model is built once (in _get_model); the CAM graph is traced once
+# per signature instead of rebuilding a Model and GradientTape on every request
+_CAM_SIGNATURE = [
+    tf.TensorSpec([1, 128, 128, 3], tf.float32),
+    tf.TensorSpec([], tf.int32),
+]
+
+def _cam_graph(img_tensor, class_idx):
+    with tf.GradientTape() as tape:
+        tape.watch(img_tensor)
+        conv_out, vgg_preds = _grad_model(img_tensor)
+        loss = vgg_preds[:, class_idx]
+
+    grads = tape.gradient(loss, conv_out)[0]
+    weights = tf.reduce_mean(grads, axis=(0, 1))
+    cam = conv_out[0] @ weights[..., tf.newaxis]
+    # Scaled to 0..255 here, on the 8x8 feature map, rather than after upsampling
+    return tf.squeeze(tf.maximum(cam, 0) * (255.0 / (tf.math.reduce_max(cam) + 1e-10)))
+
+_compute_cam = _xla_function(_cam_graph, _CAM_SIGNATURE, "Grad-CAM")
+
+def compute_cam(img_tensor, class_idx):
+    class_tensor = tf.constant(int(class_idx), dtype=tf.int32)
+    return _compute_cam(img_tensor, class_tensor).numpy()
+
+CONTOUR_THRESHOLD = 190
+
+def final_fix_predict_v4(img_source):
+    # img_source is either the uploaded file's raw bytes or a path on disk.
+    # Classification and Grad-CAM both use the lazily loaded module model.
+    is_bytes = isinstance(img_source, (bytes, bytearray, memoryview))
+    if not is_bytes and not os.path.exists(img_source):
         return None, None, "File Not Found", 0, None
 
     try:
@@ -76,55 +392,68 @@ def final_fix_predict_v4(img_path, model):
         img_size = 128
 
         # 2. LOAD & NORMALIZE (1./255 scaling)
-        img = tf.keras.preprocessing.image.load_img(img_path, target_size=(img_size, img_size))
-        img_array = tf.keras.preprocessing.image.img_to_array(img)
+        # OpenCV decode + resize instead of the Keras/PIL loader. NEAREST_EXACT
+        # reproduces load_img's default resampling and EXIF orientation is
+        # ignored (load_img never applied it), so inputs match training.
+        if is_bytes:
+            bgr = cv2.imdecode(np.frombuffer(img_source, np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        else:
+            bgr = cv2.imread(img_source, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+        if bgr is None:
+            return None, None, "Unreadable Image", 0, None
+        # Resize first (nearest-neighbour commutes with the channel swap), keep
+        # the BGR copy for the report figures and give the model RGB
+        img_bgr = cv2.resize(bgr, (img_size, img_size), interpolation=cv2.INTER_NEAREST_EXACT)
+        img_array = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
         
         # Scaling matching the 'augment_image' function in your notebook
-        img_scaled = img_array / 255.0 
-        img_expanded = np.expand_dims(img_scaled, axis=0)
+        img_scaled = img_array.astype(np.float32) * np.float32(1.0 / 255.0)
+        img_expanded = img_scaled[None, ...]
+        img_tensor = tf.constant(img_expanded, dtype=tf.float32)
 
         # 3. GET PREDICTION
-        preds = model.predict(img_expanded, verbose=0)
+        # Direct __call__ (via the shared batcher) skips predict()'s data adapter
+        # and per-call function build, which also leaks memory in a long-lived server
+        preds = _batcher.submit(img_expanded).result()
         class_idx = np.argmax(preds[0])
         confidence = np.max(preds[0]) * 100
         label_name = mapping[class_idx]
 
-        # 4. PREPARE FIGURES (RGB format)
-        input_img = img_array.astype(np.uint8).copy()
-        output_img = img_array.astype(np.uint8).copy() # Fresh copy for drawing
+        # 4. PREPARE FIGURES (BGR format, encoded as-is by np_to_reader)
+        # img_bgr is already a fresh uint8 buffer and the input figure is never
+        # drawn on, so it is shared read-only; only the contour figure gets a copy
+        input_img = img_bgr
+        input_img.setflags(write=False)
+        output_img = img_bgr.copy() if class_idx != 2 else img_bgr # Fresh copy for drawing
         heatmap_255 = np.zeros((img_size, img_size), dtype=np.uint8)
 
         # 5. LOCALIZATION
         if class_idx != 2: 
-            vgg_base = model.get_layer('vgg16')
-            last_conv = vgg_base.get_layer("block5_conv3")
-            grad_model = tf.keras.models.Model([vgg_base.input], [last_conv.output, vgg_base.output])
-            
-            img_tensor = tf.Variable(tf.cast(img_expanded, tf.float32)) 
-            with tf.GradientTape() as tape:
-                tape.watch(img_tensor)
-                conv_out, vgg_preds = grad_model(img_tensor)
-                loss = vgg_preds[:, class_idx]
-            
-            grads = tape.gradient(loss, conv_out)[0] 
-            weights = tf.reduce_mean(grads, axis=(0, 1))
-            cam = conv_out[0] @ weights[..., tf.newaxis]
-            cam = tf.squeeze(tf.maximum(cam, 0) / (tf.math.reduce_max(cam) + 1e-10)).numpy()
+            cam = compute_cam(img_tensor, class_idx)
             
             # --- UPDATED BOUNDARY TRACE LOGIC ---
-            heatmap_255 = np.uint8(255 * cv2.resize(cam, (img_size, img_size)))
+            # CAM comes back ReLU'd and already scaled to 0..255 at feature-map
+            # resolution; bilinear upsampling is linear, so one resize into a
+            # reused float buffer and a truncating cast (like np.uint8 did) is
+            # all that is left at 128x128
+            cam_up = _thread_buffer("cam_up", (img_size, img_size), np.float32)
+            cv2.resize(cam, (img_size, img_size), dst=cam_up, interpolation=cv2.INTER_LINEAR)
+            np.copyto(heatmap_255, cam_up, casting='unsafe')
             
             # CHANGE HERE: Replaced Otsu with a fixed high threshold (190)
             # 50-100 captures Blue/Green
             # 190+ captures Red/Yellow (The core)
-            _, thresh = cv2.threshold(heatmap_255, 190, 255, cv2.THRESH_BINARY) 
-            
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            if contours:
-                best_cnt = max(contours, key=cv2.contourArea)
-                # Drawing Red Contour with thickness 2
-                cv2.drawContours(output_img, [best_cnt], -1, (255, 0, 0), 2)
+            # A diffuse CAM with nothing above the threshold yields an empty mask,
+            # so skip thresholding and contour extraction entirely
+            if heatmap_255.max() > CONTOUR_THRESHOLD:
+                _, thresh = cv2.threshold(heatmap_255, CONTOUR_THRESHOLD, 255, cv2.THRESH_BINARY) 
+                
+                contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                
+                if contours:
+                    best_cnt = max(contours, key=cv2.contourArea)
+                    # Drawing Red Contour with thickness 2 (BGR)
+                    cv2.drawContours(output_img, [best_cnt], -1, (0, 0, 255), 2)
 
         return input_img, output_img, label_name, confidence, heatmap_255
 
@@ -133,6 +462,29 @@ def final_fix_predict_v4(img_path, model):
         return None, None, "ERROR", 0, None
 
 # --- 4. PROFESSIONAL DOCTOR AI ---
+# The prompt already carries tumor type, exact confidence and patient details,
+# so identical prompts (repeat scans, demos) reuse the earlier report instead
+# of another multi-second Vertex AI round trip. Failures raise and are not cached.
+@lru_cache(maxsize=256)
+def _cached_report(prompt):
+    # 🟢 USING YOUR REQUESTED MODEL
+    response = _get_client().models.generate_content(
+        model="gemini-2.5-pro",
+        contents=prompt,
+        config={
+            "safety_settings": [
+                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+            ]
+        }
+    )
+    
+    if not response.text:
+        raise ValueError("Empty response")
+    return response.text
+
 def generate_gemini_report(tumor_type, confidence, patient_data):
     try:
         print("🔵 Generating Professional AI Report...")
@@ -157,25 +509,9 @@ def generate_gemini_report(tumor_type, confidence, patient_data):
         **RECOMMENDATION:** [Specific next steps.]
         """
         
-        # 🟢 USING YOUR REQUESTED MODEL
-        response = client.models.generate_content(
-            model="gemini-2.5-pro",
-            contents=prompt,
-            config={
-                "safety_settings": [
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                ]
-            }
-        )
-        
-        if not response.text:
-            raise ValueError("Empty response")
-            
-        print(f"✅ Report Generated ({len(response.text)} chars)")
-        return response.text
+        report_text = _cached_report(prompt)
+        print(f"✅ Report Generated ({len(report_text)} chars)")
+        return report_text
 
     except Exception as e:
         print(f"❌ GEMINI ERROR: {e}") 
@@ -197,11 +533,41 @@ def generate_gemini_report(tumor_type, confidence, patient_data):
         """
 
 # --- 5. PDF GENERATOR (SMART FONT SCALING) ---
-def create_pdf_in_memory(gemini_text, patient_data, img_orig, img_heat, img_cont, tumor_type, confidence):
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=LETTER)
-    width, height = LETTER 
-    
+# Page geometry never changes, so positions, paragraph styles and the
+# Markdown-bold pattern are computed once instead of on every report
+PAGE_WIDTH, PAGE_HEIGHT = LETTER
+BOX_TOP = PAGE_HEIGHT - 60
+BOX_HEIGHT = 90
+SUMMARY_Y = BOX_TOP - BOX_HEIGHT - 25
+IMG_Y_POS = SUMMARY_Y - 150
+LABEL_Y_POS = IMG_Y_POS - 15
+
+_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+_STYLE_SHEET = getSampleStyleSheet()
+
+def _report_style(font_size, leading):
+    return ParagraphStyle(
+        'ProfessionalReport',
+        parent=_STYLE_SHEET['Normal'],
+        fontSize=font_size,
+        leading=leading,
+        alignment=TA_JUSTIFY,
+        spaceAfter=10
+    )
+
+# Keyed by font size
+_REPORT_STYLES = {
+    7: _report_style(7, 9),
+    8: _report_style(8, 10),
+    9: _report_style(9, 12),
+    10: _report_style(10, 14),
+}
+
+def _draw_static_layout(c):
+    # Everything on the page that does not depend on the patient or the scan
+    width, height = PAGE_WIDTH, PAGE_HEIGHT
+    c.saveState()
+
     # --- HEADER ---
     c.setStrokeColor(colors.darkblue)
     c.setLineWidth(3)
@@ -209,26 +575,62 @@ def create_pdf_in_memory(gemini_text, patient_data, img_orig, img_heat, img_cont
     c.setFillColor(colors.darkblue)
     c.setFont("Helvetica-Bold", 22)
     c.drawString(30, height - 30, "BrainWorks Medical Healthcare")
-    
-    # --- PATIENT INFO ---
-    box_top = height - 60
-    box_height = 90
+
+    # --- PATIENT INFO BOX ---
     c.setStrokeColor(colors.black)
     c.setLineWidth(1)
     c.setFillColor(colors.white)
-    c.rect(30, box_top - box_height, width - 60, box_height, fill=0)
+    c.rect(30, BOX_TOP - BOX_HEIGHT, width - 60, BOX_HEIGHT, fill=0)
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(300, BOX_TOP - 40, "Ref: MRI Brain Scan Analysis")
+    c.drawString(300, BOX_TOP - 60, "Modality: MRI Brain (Multi-planar)")
+
+    # --- IMAGE LABELS ---
+    c.setFont("Helvetica-Bold", 9)
+    c.drawCentredString(105, LABEL_Y_POS, "Source MRI Sequence")
+    c.drawCentredString(305, LABEL_Y_POS, "AI Attention Map (Grad-CAM)")
+    c.drawCentredString(505, LABEL_Y_POS, "Tumor Segmentation Analysis")
+
+    # --- FOOTER ---
+    c.setStrokeColor(colors.lightgrey)
+    c.line(30, 50, width - 30, 50)
+    c.setFont("Helvetica-Oblique", 8)
+    c.setFillColor(colors.grey)
+    c.drawString(30, 35, "Electronically Signed by: BrainWorks System | Verified by our smartest Models.")
+
+    c.restoreState()
+
+# JPEG for the photographic frames (much cheaper than PNG deflate);
+# the contour overlay stays PNG so the thin red trace keeps crisp edges.
+# Encoded with OpenCV (libjpeg-turbo) straight from the BGR array, no copy.
+def np_to_reader(bgr, fmt='JPEG'):
+    if fmt == 'JPEG':
+        ok, encoded = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    else:
+        ok, encoded = cv2.imencode('.png', bgr)
+    if not ok:
+        raise ValueError(f"{fmt} encoding failed")
+    return ImageReader(io.BytesIO(encoded))
+
+def create_pdf_in_memory(gemini_text, patient_data, img_orig, img_heat, img_cont, tumor_type, confidence):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=LETTER)
+    width = PAGE_WIDTH
+    _draw_static_layout(c)
     
+    # --- PATIENT INFO ---
+    box_top = BOX_TOP
+    now = datetime.now()
     c.setFillColor(colors.black)
     c.setFont("Helvetica-Bold", 10)
     c.drawString(40, box_top - 20, f"Patient: {patient_data.get('name', 'N/A')}")
     c.drawString(40, box_top - 40, f"Age / Gender: {patient_data.get('age', 'N/A')} / {patient_data.get('gender', 'N/A').capitalize()}")
-    c.drawString(40, box_top - 60, f"ID: BW-{datetime.now().strftime('%m%d%H')}")
-    c.drawString(300, box_top - 20, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    c.drawString(300, box_top - 40, "Ref: MRI Brain Scan Analysis")
-    c.drawString(300, box_top - 60, "Modality: MRI Brain (Multi-planar)")
+    c.drawString(40, box_top - 60, f"ID: BW-{now.strftime('%m%d%H')}")
+    c.drawString(300, box_top - 20, f"Date: {now.strftime('%Y-%m-%d %H:%M:%S')}")
 
     # --- SUMMARY ---
-    summary_y = box_top - box_height - 25
+    summary_y = SUMMARY_Y
     c.setFont("Helvetica-Bold", 12)
     c.setFillColor(colors.darkred if "Healthy" not in tumor_type and "No Tumor" not in tumor_type else colors.darkgreen)
     c.drawString(30, summary_y, f"DIAGNOSTIC SUMMARY: {tumor_type.upper()}")
@@ -237,86 +639,56 @@ def create_pdf_in_memory(gemini_text, patient_data, img_orig, img_heat, img_cont
     c.drawRightString(width - 30, summary_y, f"AI Model Confidence: {confidence}")
 
     # --- IMAGES (TOP) ---
-    img_y_pos = summary_y - 150 
+    img_y_pos = IMG_Y_POS
     img_w, img_h = 130, 130
     
-    def pil_to_reader(pil_img):
-        img_byte_arr = io.BytesIO()
-        pil_img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        return ImageReader(img_byte_arr)
-
-    c.drawImage(pil_to_reader(img_orig), 40, img_y_pos, width=img_w, height=img_h)
-    c.drawImage(pil_to_reader(img_heat), 240, img_y_pos, width=img_w, height=img_h)
-    c.drawImage(pil_to_reader(img_cont), 440, img_y_pos, width=img_w, height=img_h)
+    # Images arrive already encoded (see np_to_reader) so that work can overlap
+    # with the Gemini call in predict_tumor
+    c.drawImage(img_orig, 40, img_y_pos, width=img_w, height=img_h)
+    c.drawImage(img_heat, 240, img_y_pos, width=img_w, height=img_h)
+    c.drawImage(img_cont, 440, img_y_pos, width=img_w, height=img_h)
     
-    label_y_pos = img_y_pos - 15
-    c.setFont("Helvetica-Bold", 9)
-    c.drawCentredString(105, label_y_pos, "Source MRI Sequence")
-    c.drawCentredString(305, label_y_pos, "AI Attention Map (Grad-CAM)")
-    c.drawCentredString(505, label_y_pos, "Tumor Segmentation Analysis")
-
     # --- REPORT BODY (BOTTOM - AUTO SCALING) ---
-    frame_top_y = label_y_pos - 20 
+    frame_top_y = LABEL_Y_POS - 20 
     frame_bottom_y = 60 
     frame_height = frame_top_y - frame_bottom_y
 
-    style_sheet = getSampleStyleSheet()
-    
     # 🟢 5. SMART FONT SCALER
     text_len = len(gemini_text)
     
     # Defaults
     font_size = 10
-    leading = 14
     
     # If text is huge, shrink the font so it fits
     if text_len > 1800:
         font_size = 7
-        leading = 9
     elif text_len > 1500:
         font_size = 8
-        leading = 10
     elif text_len > 1200:
         font_size = 9
-        leading = 12
 
-    style = ParagraphStyle(
-        'ProfessionalReport',
-        parent=style_sheet['Normal'],
-        fontSize=font_size,
-        leading=leading,
-        alignment=TA_JUSTIFY,
-        spaceAfter=10
-    )
+    style = _REPORT_STYLES[font_size]
     
     # Formatting
     safe_text = html.escape(gemini_text)
-    formatted_text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', safe_text)
+    formatted_text = _BOLD_RE.sub(r'<b>\1</b>', safe_text)
     formatted_text = formatted_text.replace("\n", "<br/>")
     
     p = Paragraph(formatted_text, style)
     text_frame = Frame(30, frame_bottom_y, width - 60, frame_height, showBoundary=0)
     text_frame.addFromList([p], c)
     
-    # --- FOOTER ---
-    c.setStrokeColor(colors.lightgrey)
-    c.line(30, 50, width - 30, 50)
-    c.setFont("Helvetica-Oblique", 8)
-    c.setFillColor(colors.grey)
-    c.drawString(30, 35, "Electronically Signed by: BrainWorks System | Verified by our smartest Models.")
-    
     c.save()
     pdf_data = buffer.getvalue()
     buffer.close()
     return pdf_data
 
 # --- 6. ORCHESTRATOR ---
-def predict_tumor(image_path, patient_data):
-    if model is None:
+def predict_tumor(image_source, patient_data):
+    if _get_model() is None:
         return {"result": "System Error", "report": "Model not loaded."}
     try:
-        in_img, out_img, label, conf_val, hmap = final_fix_predict_v4(image_path, model)
+        in_img, out_img, label, conf_val, hmap = final_fix_predict_v4(image_source)
         if in_img is None:
             return {"result": "Error", "error": "Processing failed"}
 
@@ -328,17 +700,28 @@ def predict_tumor(image_path, patient_data):
             
         conf_str = f"{round(conf_val, 2)}%"
 
-        detailed_report = generate_gemini_report(tumor_type, conf_str, patient_data)
-
-        pil_orig = Image.fromarray(in_img)
-        hmap_color = cv2.applyColorMap(hmap, cv2.COLORMAP_JET)
-        hmap_rgb = cv2.cvtColor(hmap_color, cv2.COLOR_BGR2RGB) 
-        pil_heat = Image.fromarray(hmap_rgb)
-        pil_cont = Image.fromarray(out_img)
+        # Gemini is network-bound; prepare the report images while it runs.
+        # One executor per call so concurrent scans never queue behind each
+        # other's Gemini round trips (the request threadpool already bounds them).
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini")
+        gemini_future = executor.submit(generate_gemini_report, tumor_type, conf_str, patient_data)
+        try:
+            # Colormap (BGR) straight into this thread's scratch buffer
+            hmap_bgr = _thread_buffer("heat_bgr", hmap.shape + (3,), np.uint8)
+            cv2.applyColorMap(hmap, cv2.COLORMAP_JET, dst=hmap_bgr)
+
+            img_orig = np_to_reader(in_img)
+            img_heat = np_to_reader(hmap_bgr)
+            img_cont = np_to_reader(out_img, fmt='PNG')
+
+            detailed_report = gemini_future.result()
+        finally:
+            # Never block an error response on the in-flight Gemini round trip
+            executor.shutdown(wait=False, cancel_futures=True)
 
         pdf_bytes = create_pdf_in_memory(
             detailed_report, patient_data, 
-            pil_orig, pil_heat, pil_cont,
+            img_orig, img_heat, img_cont,
             tumor_type, conf_str
         )
         
@@ -347,7 +730,7 @@ def predict_tumor(image_path, patient_data):
             "type": tumor_type,
             "confidence": conf_str, 
             "report": detailed_report, 
-            "pdf_bytes": pdf_bytes.hex(),
+            "pdf_bytes": pdf_bytes, # raw bytes; main.py pops these before the JSON response
             "raw_score": str(conf_val)
         }
     except Exception as e: